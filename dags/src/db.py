@@ -0,0 +1,116 @@
+import csv
+import io
+
+from sqlalchemy import text
+
+
+def psql_copy(pd_table, conn, keys, data_iter):
+    """
+    pandas `to_sql` method that bulk-loads each chunk with Postgres COPY.
+
+    Streams the rows as CSV through `COPY ... FROM STDIN`, which bypasses
+    per-statement SQL parsing/planning and is typically 10-20x faster than
+    multi-valued INSERTs on Postgres.
+    """
+    raw_conn = conn.connection
+    with raw_conn.cursor() as cursor:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerows(data_iter)
+        buf.seek(0)
+
+        columns = ", ".join(f'"{k}"' for k in keys)
+        if pd_table.schema:
+            table_name = f"{pd_table.schema}.{pd_table.name}"
+        else:
+            table_name = pd_table.name
+
+        cursor.copy_expert(f"COPY {table_name} ({columns}) FROM STDIN WITH CSV", buf)
+
+
+def psycopg2_values(pd_table, conn, keys, data_iter):
+    """
+    pandas `to_sql` method built on psycopg2's execute_values.
+
+    Fallback for connections where copy_expert is unavailable: each page is
+    folded into one multi-valued INSERT server-side, which still beats
+    per-row executemany by orders of magnitude.
+    """
+    from psycopg2.extras import execute_values
+
+    columns = ", ".join(f'"{k}"' for k in keys)
+    if pd_table.schema:
+        table_name = f"{pd_table.schema}.{pd_table.name}"
+    else:
+        table_name = pd_table.name
+
+    with conn.connection.cursor() as cursor:
+        execute_values(
+            cursor,
+            f"INSERT INTO {table_name} ({columns}) VALUES %s",
+            data_iter,
+            page_size=10_000
+        )
+
+
+def insert_method_for(bind):
+    """
+    Picks the fastest `to_sql` method the given engine/connection supports:
+    COPY under psycopg2, pandas' generic multi-valued INSERT everywhere else
+    (other Postgres drivers, SQLite in local dev, ...). psycopg2_values is
+    psycopg2-only as well, so it stays an explicit opt-in for callers that
+    want multi-valued INSERT semantics - e.g. appending to an already
+    published table - rather than a branch here that could never succeed on
+    the drivers that would reach it.
+    """
+    if bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2":
+        return psql_copy
+    return "multi"
+
+
+def copy_unlogged(conn, dataframe, schema, table_name, dtypes=None):
+    """
+    Bulk-load a frame into `{schema}.{table_name}` with WAL disabled.
+
+    Creates the table empty, flips it to UNLOGGED so the COPY skips the WAL
+    write for every row, then back to LOGGED once the data is in, so the
+    table is crash-safe again by the time it is published. The pipeline's
+    tables are all derived from a file on disk, so losing an in-flight load
+    to a crash costs nothing but a re-run.
+    """
+    dataframe.head(0).to_sql(
+        name=table_name,
+        con=conn,
+        schema=schema,
+        if_exists='replace',
+        index=False,
+        dtype=dtypes
+    )
+    conn.execute(text(f"ALTER TABLE {schema}.{table_name} SET UNLOGGED"))
+    dataframe.to_sql(
+        name=table_name,
+        con=conn,
+        schema=schema,
+        if_exists='append',
+        index=False,
+        chunksize=100_000,
+        method=insert_method_for(conn)
+    )
+    conn.execute(text(f"ALTER TABLE {schema}.{table_name} SET LOGGED"))
+
+
+def swap_table(conn, schema, table_name):
+    """
+    Atomically publish `{schema}.{table_name}_new` under its final name.
+
+    The bulk load happens against the `_new` staging table with no readers
+    attached; the renames here are metadata-only catalog updates, so the
+    published name is never locked for longer than microseconds.
+    """
+    conn.execute(text(f"DROP TABLE IF EXISTS {schema}.{table_name}_old"))
+    conn.execute(text(
+        f"ALTER TABLE IF EXISTS {schema}.{table_name} RENAME TO {table_name}_old"
+    ))
+    conn.execute(text(
+        f"ALTER TABLE {schema}.{table_name}_new RENAME TO {table_name}"
+    ))
@@ -1,9 +1,12 @@
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.types import Integer, String, Float, Date
 from sqlalchemy.exc import SQLAlchemyError
 from pathlib import Path
+import csv
+import io
 import os
+from src.db import copy_unlogged, swap_table
 from src.logger import setup_logger
 
 SCRIPT_PATH = Path(__file__).resolve()
@@ -12,6 +15,11 @@ LOGS_DIR = PROJECT_ROOT / "logs"
 DATA_DIR = PROJECT_ROOT / "data" / "raw"
 FILE_NAME = "sport_products_sales_analysis_challenge_raw.xlsx"
 FILE_PATH = DATA_DIR / FILE_NAME
+PARQUET_PATH = DATA_DIR / "sales_raw.parquet"
+
+# Above this size the pandas path would materialize the whole workbook in RAM;
+# stream rows straight into COPY instead
+STREAM_THRESHOLD_BYTES = 200 * 1024 * 1024
 
 LOGS_DIR.mkdir(exist_ok=True)
 LOG_FILE = LOGS_DIR / f"{SCRIPT_PATH.stem}.log"
@@ -27,6 +35,97 @@ DB_NAME = "sports_store"
 # Connection string
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# Module-level pooled engine: connections are reused across the task run,
+# pool_pre_ping revalidates stale sockets, and values_plus_batch batches any
+# non-COPY executemany path server-side
+engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=8,
+    executemany_mode='values_plus_batch',
+)
+
+def _file_fingerprint(path: Path) -> str:
+    """
+    Cheap change detector for the input file (mtime + size, no full read).
+    """
+    st = path.stat()
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+def _record_fingerprint(fingerprint: str):
+    """
+    Stores the input file's fingerprint after a successful load.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO raw.ingest_state (filename, fingerprint, loaded_at)
+            VALUES (:filename, :fingerprint, now())
+            ON CONFLICT (filename) DO UPDATE
+                SET fingerprint = EXCLUDED.fingerprint,
+                    loaded_at = EXCLUDED.loaded_at
+        """), {"filename": FILE_NAME, "fingerprint": fingerprint})
+
+# Postgres column types for the streaming path, which creates the table
+# itself instead of going through pandas' to_sql DDL
+PG_COLUMN_TYPES = {
+    "Retailer": "TEXT",
+    "Retailer ID": "TEXT",
+    "Invoice Date": "DATE",
+    "Region": "TEXT",
+    "State": "TEXT",
+    "City": "TEXT",
+    "Product": "TEXT",
+    "Price per Unit": "DOUBLE PRECISION",
+    "Units Sold": "INTEGER",
+    "Total Sales": "DOUBLE PRECISION",
+    "Operating Proft": "DOUBLE PRECISION",
+    "Operating Margin": "DOUBLE PRECISION",
+    "Sales Method": "TEXT"
+}
+
+def _stream_excel_to_table(conn, schema, table_name, batch_rows=100_000):
+    """
+    Streams the workbook into `{schema}.{table_name}` with no pandas
+    intermediate: openpyxl's read-only mode yields one row at a time and the
+    rows go to Postgres in COPY batches, so peak memory stays O(batch)
+    instead of O(file). Returns the number of rows loaded.
+    """
+    import openpyxl
+
+    wb = openpyxl.load_workbook(FILE_PATH, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows)
+
+        column_defs = ", ".join(f'"{h}" {PG_COLUMN_TYPES.get(h, "TEXT")}' for h in header)
+        conn.execute(text(f"DROP TABLE IF EXISTS {schema}.{table_name}"))
+        conn.execute(text(f"CREATE UNLOGGED TABLE {schema}.{table_name} ({column_defs})"))
+
+        columns = ", ".join(f'"{h}"' for h in header)
+        copy_sql = f"COPY {schema}.{table_name} ({columns}) FROM STDIN WITH CSV"
+
+        total = 0
+        with conn.connection.cursor() as cursor:
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for row in rows:
+                writer.writerow(row)
+                total += 1
+                if total % batch_rows == 0:
+                    buf.seek(0)
+                    cursor.copy_expert(copy_sql, buf)
+                    buf.seek(0)
+                    buf.truncate(0)
+            if buf.tell():
+                buf.seek(0)
+                cursor.copy_expert(copy_sql, buf)
+
+        conn.execute(text(f"ALTER TABLE {schema}.{table_name} SET LOGGED"))
+        return total
+    finally:
+        wb.close()
+
 def load_data():
     """
     Loads the Excel dataset into the PostgreSQL database.
@@ -35,23 +134,80 @@ def load_data():
         logger.error(f"File not found at: {FILE_PATH}")
         return
 
-    engine = None
     try:
         logger.info(f"Establishing connection to database '{DB_NAME}' at {DB_HOST}:{DB_PORT}...")
-        engine = create_engine(DATABASE_URL)
-        
+
         # Test connection
         with engine.connect() as conn:
             logger.info("Database connection successful.")
 
-        logger.info(f"Reading Excel file: {FILE_PATH}")
-        # Read Excel file
-        df = pd.read_excel(FILE_PATH)
-        
-        logger.info(f"File read successfully. Rows: {df.shape[0]}, Columns: {df.shape[1]}")
+        # Short-circuit: if the workbook hasn't changed since the last run,
+        # the parse and the load would only reproduce what is already there
+        fingerprint = _file_fingerprint(FILE_PATH)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE SCHEMA IF NOT EXISTS raw"))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS raw.ingest_state (
+                    filename TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """))
+            previous = conn.execute(
+                text("SELECT fingerprint FROM raw.ingest_state WHERE filename = :filename"),
+                {"filename": FILE_NAME}
+            ).scalar()
 
         table_name = "sales_raw"
         schema = "raw"
+        streaming = FILE_PATH.stat().st_size >= STREAM_THRESHOLD_BYTES
+
+        # The streaming path never writes a snapshot, so it only needs a
+        # matching fingerprint to skip
+        if previous == fingerprint and (PARQUET_PATH.exists() or streaming):
+            logger.info("Input file unchanged since last load. Skipping re-ingest.")
+            return
+
+        if streaming:
+            # Workbook too large to materialize in pandas: stream rows
+            # straight into the staging table and swap it in
+            logger.info(f"Streaming Excel file into {schema}.{table_name}: {FILE_PATH}")
+            with engine.begin() as conn:
+                row_count = _stream_excel_to_table(conn, schema, f"{table_name}_new")
+                swap_table(conn, schema, table_name)
+                conn.execute(text(f"DROP TABLE IF EXISTS {schema}.{table_name}_old"))
+
+            # This path writes no snapshot, so a leftover one from an earlier
+            # sub-threshold run would shadow the fresh data in transform_data
+            PARQUET_PATH.unlink(missing_ok=True)
+
+            logger.info(f"Successfully loaded {row_count} rows into {schema}.{table_name}.")
+
+            # Record the fingerprint only after a successful load
+            _record_fingerprint(fingerprint)
+            return
+
+        logger.info(f"Reading Excel file: {FILE_PATH}")
+        # calamine parses the XLSX in Rust (~3x faster, far lower peak RAM than
+        # openpyxl's XML DOM); pinning dtypes skips pandas' schema-inference pass
+        df = pd.read_excel(
+            FILE_PATH,
+            engine="calamine",
+            sheet_name=0,
+            dtype={
+                "Retailer": "string",
+                "Retailer ID": "string",
+                "Region": "string",
+                "State": "string",
+                "City": "string",
+                "Product": "string",
+                "Operating Margin": "float64",
+                "Sales Method": "string"
+            },
+            parse_dates=["Invoice Date"]
+        )
+        
+        logger.info(f"File read successfully. Rows: {df.shape[0]}, Columns: {df.shape[1]}")
 
         logger.info(f"Starting insertion into {schema}.{table_name}...")
         
@@ -64,36 +220,39 @@ def load_data():
             "State": String,
             "City": String,
             "Product": String,
-            "Price per Unit": Integer,
+            "Price per Unit": Float,
             "Units Sold": Integer,
-            "Total Sales": Integer,
-            "Operating Proft": Integer,
+            "Total Sales": Float,
+            "Operating Proft": Float,
             "Operating Margin": Float,
             "Sales Method": String
         }
 
-        # Use chunksize to handle large datasets efficiently during insertion
-        # method='multi' allows for multiple rows per INSERT statement, significantly faster
-        df.to_sql(
-            name=table_name,
-            con=engine,
-            schema=schema,
-            if_exists='replace', # Options: 'fail', 'replace', 'append'
-            index=False,
-            chunksize=1000, 
-            method='multi',
-            dtype=dtype_mapping
-        )
-        
+        # COPY FROM STDIN streams whole chunks past the SQL parser, the _new
+        # staging table stays UNLOGGED while the rows land (no per-row WAL),
+        # and the published name is swapped in atomically at the end, so
+        # readers of raw.sales_raw never see a dropped or half-loaded table.
+        with engine.begin() as conn:
+            copy_unlogged(conn, df, schema, f"{table_name}_new", dtype_mapping)
+            swap_table(conn, schema, table_name)
+            # The previous run's table isn't worth a full extra copy on disk
+            conn.execute(text(f"DROP TABLE IF EXISTS {schema}.{table_name}_old"))
+
         logger.info(f"Successfully loaded {len(df)} rows into {schema}.{table_name}.")
 
+        # Columnar snapshot so transform_data can skip the Postgres round
+        # trip. Written only after the raw load committed, so a failed load
+        # can never leave a snapshot ahead of raw.sales_raw.
+        df.to_parquet(PARQUET_PATH, compression="zstd")
+        logger.info(f"Parquet snapshot written to {PARQUET_PATH}")
+
+        # Record the fingerprint only after a successful load
+        _record_fingerprint(fingerprint)
+
     except SQLAlchemyError as e:
         logger.error(f"Database error occurred: {e}")
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}")
-    finally:
-        if engine:
-            engine.dispose()
 
 if __name__ == "__main__":
     load_data()
@@ -0,0 +1,64 @@
+import csv
+import io
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "dags"))
+
+from src.db import psql_copy
+
+XLSX_PATH = (
+    Path(__file__).resolve().parent.parent
+    / "dags" / "data" / "raw" / "sport_products_sales_analysis_challenge_raw.xlsx"
+)
+
+
+class FakeCursor:
+    def __init__(self, copies):
+        self.copies = copies
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def copy_expert(self, sql, file):
+        self.copies.append((sql, file.read()))
+
+
+class FakeConnection:
+    """Mimics the SQLAlchemy connection surface psql_copy touches."""
+
+    def __init__(self):
+        self.copies = []
+        self.connection = SimpleNamespace(cursor=lambda: FakeCursor(self.copies))
+
+
+def test_psql_copy_streams_real_rows_as_csv():
+    df = pd.read_excel(XLSX_PATH, nrows=200)
+    keys = list(df.columns)
+    data_iter = (tuple(row) for row in df.itertuples(index=False, name=None))
+
+    conn = FakeConnection()
+    pd_table = SimpleNamespace(name="sales_raw_new", schema="raw")
+    psql_copy(pd_table, conn, keys, data_iter)
+
+    assert len(conn.copies) == 1
+    sql, payload = conn.copies[0]
+    assert sql.startswith('COPY raw.sales_raw_new ("Retailer"')
+    assert sql.endswith("FROM STDIN WITH CSV")
+
+    rows = list(csv.reader(io.StringIO(payload)))
+    assert len(rows) == len(df)
+
+    # The money columns arrive from the workbook as float64 (some values are
+    # genuinely fractional), so the payload carries text like "18000.0" that
+    # Postgres only accepts into Float-declared columns, never Integer ones
+    for col in ["Price per Unit", "Total Sales", "Operating Proft"]:
+        idx = keys.index(col)
+        values = [float(row[idx]) for row in rows]
+        assert len(values) == len(df)
@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "dags"))
+
+from src.load_task import FILE_PATH, PG_COLUMN_TYPES
+
+
+def test_streaming_ddl_types_match_workbook_data():
+    # The money columns contain non-integral values, so an INTEGER
+    # declaration would make COPY reject the streamed CSV
+    df = pd.read_excel(FILE_PATH)
+    for col, pg_type in PG_COLUMN_TYPES.items():
+        if pg_type == "INTEGER":
+            values = pd.to_numeric(df[col])
+            assert (values % 1 == 0).all(), f"{col} has fractional values but is declared INTEGER"